@@ -2,6 +2,8 @@ from flask import Flask, render_template
 from flask_login import LoginManager
 from config import Config
 from models import db, User
+from symbol_index import symbol_index
+from sqlalchemy.schema import CreateIndex
 import os
 
 def create_app():
@@ -10,6 +12,7 @@ def create_app():
 
     # Initialize extensions
     db.init_app(app)
+    symbol_index.init_app(app)
 
     # Initialize Flask-Login
     login_manager = LoginManager()
@@ -36,6 +39,11 @@ def create_app():
     # Create database tables
     with app.app_context():
         db.create_all()
+        # create_all() skips indexes added to tables that already exist
+        with db.engine.begin() as connection:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    connection.execute(CreateIndex(index, if_not_exists=True))
 
     # Error handlers
     @app.errorhandler(404)
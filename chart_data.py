@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from stock_data import StockDataService
+
+def lttb(x, y, threshold):
+    """Downsample a series with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, for each bucket in between, the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket. Peaks and troughs survive, unlike plain
+    striding or averaging. Returns the indices of the kept points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                       (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+class ChartDataService:
+    """Downsampled series for Plotly charts.
+
+    The raw series fetched from the network is cached per (ticker, exchange,
+    period), so a different chart width or a browser resize never refetches
+    the data. Widths are rounded up to WIDTH_STEP pixels and the downsampled
+    payloads kept in a small LRU cache, so repeated views skip LTTB as well.
+    """
+
+    # Raw series are reused for this many seconds
+    CACHE_TTL = 15 * 60
+    CACHE_SIZE = 256
+    MIN_WIDTH = 50
+    MAX_WIDTH = 4000
+    WIDTH_STEP = 50
+    PAYLOAD_CACHE_SIZE = 512
+
+    _cache = {}
+    _payloads = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def downsample(timestamps, values, width):
+        """Downsample a series to at most one point per pixel of width"""
+        x = np.asarray(timestamps, dtype=np.float64)
+        y = np.asarray(values, dtype=np.float64)
+        indices = lttb(x, y, width)
+        return x[indices], y[indices]
+
+    @staticmethod
+    def to_payload(x, y):
+        """Compact JSON-ready arrays: unix seconds and values rounded to 4 places"""
+        return {
+            'x': x.astype(np.int64).tolist(),
+            'y': np.round(y, 4).tolist()
+        }
+
+    @classmethod
+    def clamp_width(cls, width):
+        """Clamp width to the allowed range and round it up to a WIDTH_STEP bucket"""
+        width = -(-width // cls.WIDTH_STEP) * cls.WIDTH_STEP
+        return max(cls.MIN_WIDTH, min(cls.MAX_WIDTH, width))
+
+    @classmethod
+    def _cached(cls, key, build):
+        now = time.monotonic()
+        with cls._lock:
+            entry = cls._cache.get(key)
+            if entry and now - entry[0] < cls.CACHE_TTL:
+                return entry[1]
+
+        series = build()
+        if not len(series[0]):
+            # Don't hold on to failed or empty lookups
+            return series
+
+        with cls._lock:
+            if len(cls._cache) >= cls.CACHE_SIZE:
+                oldest = min(cls._cache, key=lambda k: cls._cache[k][0])
+                del cls._cache[oldest]
+            cls._cache[key] = (now, series)
+        return series
+
+    @classmethod
+    def get_close_series(cls, ticker, exchange='US', period='1y'):
+        """Closing prices as (unix seconds, values) arrays, cached per period"""
+
+        def build():
+            hist = StockDataService.get_historical_data(ticker, exchange, period)
+            if hist.empty:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            close = hist['Close'].dropna()
+            return close.index.as_unit('s').asi8, close.to_numpy(dtype=np.float64)
+
+        return cls._cached(('close', ticker, exchange, period), build)
+
+    @classmethod
+    def get_price_series(cls, ticker, exchange='US', period='1y', width=800):
+        """Closing prices for a ticker, downsampled to width points"""
+        series = cls.get_close_series(ticker, exchange, period)
+        key = (ticker, exchange, period, cls.clamp_width(width))
+        with cls._lock:
+            entry = cls._payloads.get(key)
+            # A payload is only reused while it was built from the cached raw series
+            if entry and entry[0] is series:
+                cls._payloads.move_to_end(key)
+                return entry[1]
+
+        x, y = cls.downsample(*series, key[3])
+        payload = cls.to_payload(x, y)
+        if not len(x):
+            return payload
+
+        with cls._lock:
+            cls._payloads[key] = (series, payload)
+            cls._payloads.move_to_end(key)
+            if len(cls._payloads) > cls.PAYLOAD_CACHE_SIZE:
+                cls._payloads.popitem(last=False)
+        return payload
@@ -14,4 +14,14 @@ class Config:
     REMEMBER_COOKIE_DURATION = timedelta(days=7)
 
     # Pagination
-    ITEMS_PER_PAGE = 10
\ No newline at end of file
+    ITEMS_PER_PAGE = 10
+
+    # Stored prices older than this are refreshed when a portfolio is viewed
+    PRICE_REFRESH_INTERVAL = timedelta(minutes=15)
+
+    # Symbol master used for ticker autocomplete (CSV with ticker, name, exchange)
+    SYMBOL_MASTER_PATH = os.environ.get('SYMBOL_MASTER_PATH') or \
+        os.path.join(basedir, 'data', 'symbols.csv')
+    # The bundled master is only a sample, so unknown tickers are only flagged
+    # when a full listing is configured
+    WARN_UNKNOWN_SYMBOLS = bool(os.environ.get('SYMBOL_MASTER_PATH'))
\ No newline at end of file
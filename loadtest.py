@@ -0,0 +1,167 @@
+"""Concurrent load test for VirFolio using recorded market data.
+
+Record the market data for every position in the database once (needs network):
+
+    python loadtest.py record --cassette market.cassette
+
+Then drive the app with simulated users, replaying the cassette with
+injected latency instead of calling yfinance:
+
+    python loadtest.py run --cassette market.cassette --email user@example.com \\
+        --password secret --users 20 --duration 60 --think-time 1.0
+
+Requests go through the WSGI app in-process, so no server or network is needed.
+Set DATABASE_URL to point the test at a copy of the database.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+import numpy as np
+from app import create_app
+from models import Portfolio, Position, User
+from market_replay import MarketCassette, CassetteRecorder, ReplayLatency, install_replay
+
+ROUTES = {
+    'dashboard': '/dashboard',
+    'analytics': '/analytics/analytics',
+    'portfolio': '/portfolio/portfolio/<id>',
+}
+
+def record(args):
+    app = create_app()
+    recorder = CassetteRecorder()
+    with app.app_context():
+        symbols = Position.query.with_entities(Position.ticker, Position.exchange).distinct().all()
+
+    print(f"Recording market data for {len(symbols)} symbols...")
+    for ticker, exchange in symbols:
+        recorder.record_current_price(ticker, exchange)
+        recorder.record_stock_info(ticker, exchange)
+
+    recorder.save(args.cassette)
+    print(f"Saved {len(recorder.entries)} responses to {args.cassette}")
+
+class LoadStats:
+    """Thread-safe latency samples and error counts per route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, route, latency_ms, ok):
+        with self._lock:
+            self.latencies[route].append(latency_ms)
+            if not ok:
+                self.errors[route] += 1
+
+    def report(self, elapsed):
+        total = sum(len(samples) for samples in self.latencies.values())
+        print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)\n")
+        print(f"{'Route':<28}{'Requests':>10}{'Errors':>8}{'Req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, path in ROUTES.items():
+            samples = self.latencies.get(name)
+            if not samples:
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            print(f"{path:<28}{len(samples):>10}{self.errors[name]:>8}"
+                  f"{len(samples) / elapsed:>9.1f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+
+def virtual_user(app, args, portfolio_ids, stats, deadline):
+    """Log in, then request random routes with think-time pauses until the deadline"""
+    client = app.test_client()
+    response = client.post('/auth/login', data={'email': args.email, 'password': args.password})
+    if response.status_code != 302:
+        print("Login failed for virtual user")
+        return
+
+    routes = ['dashboard', 'analytics'] + (['portfolio'] if portfolio_ids else [])
+    while time.perf_counter() < deadline:
+        route = random.choice(routes)
+        path = ROUTES[route]
+        if route == 'portfolio':
+            path = path.replace('<id>', str(random.choice(portfolio_ids)))
+
+        start = time.perf_counter()
+        try:
+            response = client.get(path)
+            ok = response.status_code == 200
+        except Exception as e:
+            print(f"Error requesting {path}: {e}")
+            ok = False
+        stats.add(route, (time.perf_counter() - start) * 1000, ok)
+
+        if args.think_time > 0:
+            time.sleep(random.expovariate(1 / args.think_time))
+
+def run(args):
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    # With the default of 0 every request refreshes prices through the cassette
+    app.config['PRICE_REFRESH_INTERVAL'] = timedelta(seconds=args.price_refresh)
+
+    with app.app_context():
+        user = User.query.filter_by(email=args.email).first()
+        if user is None:
+            raise SystemExit(f"No user with email {args.email}")
+        portfolio_ids = [p.id for p in Portfolio.query.filter_by(user_id=user.id)]
+
+    cassette = MarketCassette(args.cassette)
+    latency = ReplayLatency(scale=args.latency_scale, fixed_ms=args.latency_ms,
+                            jitter_ms=args.jitter_ms)
+    restore = install_replay(cassette, latency)
+
+    print(f"Replaying {len(cassette)} recorded responses with {args.users} users "
+          f"for {args.duration}s (think time {args.think_time}s)")
+
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=virtual_user,
+                                args=(app, args, portfolio_ids, stats, deadline))
+               for _ in range(args.users)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        restore()
+        cassette.close()
+
+    stats.report(time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='VirFolio load test with recorded market data')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = subparsers.add_parser('record', help='Record market data for all positions')
+    record_parser.add_argument('--cassette', default='market.cassette')
+    record_parser.set_defaults(func=record)
+
+    run_parser = subparsers.add_parser('run', help='Run the load test against recorded data')
+    run_parser.add_argument('--cassette', default='market.cassette')
+    run_parser.add_argument('--email', required=True)
+    run_parser.add_argument('--password', required=True)
+    run_parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    run_parser.add_argument('--duration', type=float, default=30, help='Test duration in seconds')
+    run_parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Mean pause between requests per user, in seconds')
+    run_parser.add_argument('--latency-scale', type=float, default=1.0,
+                            help='Multiplier for the recorded market data latency')
+    run_parser.add_argument('--latency-ms', type=float,
+                            help='Fixed market data latency, overrides the recorded latency')
+    run_parser.add_argument('--jitter-ms', type=float, default=0.0,
+                            help='Uniform jitter added to --latency-ms')
+    run_parser.add_argument('--price-refresh', type=float, default=0,
+                            help='Seconds before stored prices are refreshed again (the app uses 900)')
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
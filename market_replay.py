@@ -0,0 +1,164 @@
+import json
+import mmap
+import random
+import struct
+import time
+import zlib
+import pandas as pd
+from stock_data import StockDataService
+
+class MarketCassette:
+    """Recorded StockDataService responses, stored in a compact local file.
+
+    File layout: magic, an 8-byte index length, a JSON index mapping each
+    request key to [offset, length, latency_ms], then the zlib-compressed
+    JSON payloads. On replay the file is memory-mapped and payloads are only
+    decompressed when they are looked up.
+    """
+
+    MAGIC = b'VFCASS1\n'
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._map[:len(self.MAGIC)] != self.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a market data cassette")
+
+        header_end = len(self.MAGIC) + 8
+        (index_length,) = struct.unpack('<Q', self._map[len(self.MAGIC):header_end])
+        self._index = json.loads(self._map[header_end:header_end + index_length])
+        self._data_start = header_end + index_length
+
+    @staticmethod
+    def make_key(method, *args):
+        """Build the lookup key for a service call"""
+        return '|'.join([method] + [str(arg) for arg in args])
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def get(self, key):
+        """Return (payload, recorded latency in ms), or (None, 0) if not recorded"""
+        entry = self._index.get(key)
+        if entry is None:
+            return None, 0
+        offset, length, latency_ms = entry
+        start = self._data_start + offset
+        payload = json.loads(zlib.decompress(self._map[start:start + length]))
+        return payload, latency_ms
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @classmethod
+    def write(cls, path, entries):
+        """Write a cassette from a {key: (payload, latency_ms)} mapping"""
+        index = {}
+        blobs = []
+        offset = 0
+        for key, (payload, latency_ms) in entries.items():
+            blob = zlib.compress(json.dumps(payload, separators=(',', ':')).encode(), 9)
+            index[key] = [offset, len(blob), round(latency_ms, 2)]
+            blobs.append(blob)
+            offset += len(blob)
+
+        index_bytes = json.dumps(index, separators=(',', ':')).encode()
+        with open(path, 'wb') as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack('<Q', len(index_bytes)))
+            f.write(index_bytes)
+            for blob in blobs:
+                f.write(blob)
+
+class CassetteRecorder:
+    """Call the live StockDataService and keep each response for a cassette"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def _record(self, key, fetch, encode):
+        start = time.perf_counter()
+        result = fetch()
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.entries[key] = (encode(result), latency_ms)
+        return result
+
+    def record_current_price(self, ticker, exchange='US'):
+        key = MarketCassette.make_key('price', ticker, exchange)
+        return self._record(key, lambda: StockDataService.get_current_price(ticker, exchange),
+                            lambda price: float(price) if price is not None else None)
+
+    def record_stock_info(self, ticker, exchange='US'):
+        key = MarketCassette.make_key('info', ticker, exchange)
+        return self._record(key, lambda: StockDataService.get_stock_info(ticker, exchange),
+                            lambda info: info)
+
+    def save(self, path):
+        MarketCassette.write(path, self.entries)
+
+class ReplayLatency:
+    """Latency injected before each replayed response.
+
+    By default the latency recorded with the response is replayed, multiplied
+    by scale. If fixed_ms is set it is used instead, with uniform jitter of
+    +/- jitter_ms.
+    """
+
+    def __init__(self, scale=1.0, fixed_ms=None, jitter_ms=0.0):
+        self.scale = scale
+        self.fixed_ms = fixed_ms
+        self.jitter_ms = jitter_ms
+
+    def delay(self, recorded_ms):
+        if self.fixed_ms is not None:
+            delay_ms = self.fixed_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        else:
+            delay_ms = recorded_ms * self.scale
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+def install_replay(cassette, latency=None):
+    """Serve StockDataService lookups from a cassette instead of the network.
+
+    Calls that were not recorded behave like failed lookups. Returns a
+    function that restores the live service.
+    """
+    latency = latency or ReplayLatency()
+
+    def lookup(key):
+        payload, recorded_ms = cassette.get(key)
+        latency.delay(recorded_ms)
+        return payload
+
+    def get_current_price(ticker, exchange='US'):
+        return lookup(MarketCassette.make_key('price', ticker, exchange))
+
+    def get_stock_info(ticker, exchange='US'):
+        return lookup(MarketCassette.make_key('info', ticker, exchange))
+
+    def get_historical_data(ticker, exchange='US', period='1mo'):
+        # None of the load-tested routes read history, so it is not recorded;
+        # answer like a failed lookup rather than reaching the network
+        return pd.DataFrame()
+
+    originals = {name: StockDataService.__dict__[name]
+                 for name in ('get_current_price', 'get_stock_info', 'get_historical_data')}
+    StockDataService.get_current_price = staticmethod(get_current_price)
+    StockDataService.get_stock_info = staticmethod(get_stock_info)
+    StockDataService.get_historical_data = staticmethod(get_historical_data)
+
+    def restore():
+        for name, method in originals.items():
+            setattr(StockDataService, name, method)
+
+    return restore
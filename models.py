@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, or_, case, func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
 from datetime import datetime
 from currency_utils import CurrencyConverter
 
@@ -40,28 +42,23 @@ class Portfolio(db.Model):
     user = db.relationship('User', back_populates='portfolios')
     positions = db.relationship('Position', back_populates='portfolio', cascade='all, delete-orphan')
 
+    # Totals are summed in INR from each position's own currency, the same way
+    # the paginated listings aggregate Position.value_inr and cost_inr in SQL
+
     def calculate_total_value(self, currency='INR'):
         """Calculate total portfolio value in specified currency"""
-        total = sum(position.calculate_market_value() for position in self.positions)
-        if self.base_currency == 'USD' and currency == 'INR':
-            return CurrencyConverter.usd_to_inr(total)
-        elif self.base_currency == 'INR' and currency == 'USD':
-            return CurrencyConverter.inr_to_usd(total)
-        return total
+        total = sum(position.value_inr for position in self.positions)
+        return CurrencyConverter.convert(total, 'INR', currency)
 
     def calculate_total_cost(self, currency='INR'):
         """Calculate total invested amount in specified currency"""
-        total = sum(position.quantity * position.buy_price for position in self.positions)
-        if self.base_currency == 'USD' and currency == 'INR':
-            return CurrencyConverter.usd_to_inr(total)
-        elif self.base_currency == 'INR' and currency == 'USD':
-            return CurrencyConverter.inr_to_usd(total)
-        return total
+        total = sum(position.cost_inr for position in self.positions)
+        return CurrencyConverter.convert(total, 'INR', currency)
 
     def calculate_total_return(self):
         """Calculate percentage return"""
-        total_value = self.calculate_total_value(self.base_currency)
-        total_cost = self.calculate_total_cost(self.base_currency)
+        total_value = self.calculate_total_value()
+        total_cost = self.calculate_total_cost()
         if total_cost > 0:
             return ((total_value - total_cost) / total_cost) * 100
         return 0
@@ -75,6 +72,8 @@ class Portfolio(db.Model):
     def __repr__(self):
         return f'<Portfolio {self.name}>'
 
+db.Index('ix_portfolios_user_name', Portfolio.user_id, Portfolio.name, Portfolio.id)
+
 class Position(db.Model):
     __tablename__ = 'positions'
 
@@ -130,5 +129,71 @@ class Position(db.Model):
             return ((self.current_price - self.buy_price) / self.buy_price) * 100
         return 0
 
+    @hybrid_method
+    def price_is_stale(self, cutoff):
+        """Whether the price was not updated since cutoff"""
+        return self.last_updated is None or self.last_updated < cutoff
+
+    @price_is_stale.expression
+    def price_is_stale(cls, cutoff):
+        return or_(cls.last_updated.is_(None), cls.last_updated < cutoff)
+
+    # Sort keys used by the paginated holdings listing. The SQL expressions
+    # only use literal constants so they compile to the same text as the
+    # expression indexes below and SQLite can match them.
+
+    @hybrid_property
+    def value_inr(self):
+        """Market value in INR, used to order positions across currencies"""
+        return self.calculate_market_value('INR')
+
+    @value_inr.expression
+    def value_inr(cls):
+        price = func.coalesce(cls.current_price, cls.buy_price)
+        return cls.quantity * price * cls._inr_rate()
+
+    @classmethod
+    def _inr_rate(cls):
+        """SQL expression for the INR conversion rate of a position's currency"""
+        rate = literal_column(repr(float(CurrencyConverter.USD_TO_INR_RATE)))
+        is_indian = cls.exchange.in_([literal_column("'NS'"), literal_column("'BO'")])
+        return case((is_indian, literal_column('1.0')), else_=rate)
+
+    @hybrid_property
+    def cost_inr(self):
+        """Cost basis in INR, used to aggregate portfolio totals"""
+        return self.calculate_cost_basis('INR')
+
+    @cost_inr.expression
+    def cost_inr(cls):
+        return cls.quantity * cls.buy_price * cls._inr_rate()
+
+    @hybrid_property
+    def return_pct(self):
+        """Percentage gain/loss, zero when there is no current price"""
+        return self.calculate_gain_loss_percentage()
+
+    @return_pct.expression
+    def return_pct(cls):
+        has_price = and_(cls.current_price.isnot(None), cls.buy_price > literal_column('0'))
+        change = (cls.current_price - cls.buy_price) * literal_column('100.0') / cls.buy_price
+        return case((has_price, change), else_=literal_column('0.0'))
+
+    @hybrid_property
+    def sector_label(self):
+        """Sector name with missing sectors grouped as Unknown"""
+        return self.sector or 'Unknown'
+
+    @sector_label.expression
+    def sector_label(cls):
+        return func.coalesce(cls.sector, literal_column("'Unknown'"))
+
     def __repr__(self):
-        return f'<Position {self.ticker}>'
\ No newline at end of file
+        return f'<Position {self.ticker}>'
+
+# Composite indexes backing the keyset-paginated holdings listing
+db.Index('ix_positions_portfolio_ticker', Position.portfolio_id, Position.ticker, Position.id)
+db.Index('ix_positions_portfolio_sector', Position.portfolio_id, Position.sector_label, Position.id)
+db.Index('ix_positions_portfolio_exchange', Position.portfolio_id, Position.exchange, Position.ticker, Position.id)
+db.Index('ix_positions_portfolio_value', Position.portfolio_id, Position.value_inr, Position.id)
+db.Index('ix_positions_portfolio_return', Position.portfolio_id, Position.return_pct, Position.id)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+from sqlalchemy import and_, or_
+
+
+class KeysetPage:
+    """A single page of keyset-paginated results"""
+
+    def __init__(self, items, next_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(sort, key):
+    """Encode the sort name and (sort value, id) of the last row as an opaque token"""
+    payload = json.dumps({'s': sort, 'k': list(key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Decode a cursor token, returning None if it is invalid or from another sort"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = payload['k']
+        if payload['s'] != sort or len(key) != 2:
+            return None
+        return key
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+
+
+def keyset_paginate(query, sort, sort_column, id_column, descending=False,
+                    cursor=None, per_page=10):
+    """Fetch the page following cursor, ordered by (sort_column, id_column).
+
+    Instead of OFFSET, the query seeks past the last row of the previous page,
+    so with an index on (filter columns, sort_column, id_column) every page
+    costs the same as the first one. Rows are returned as the query would
+    return them; the sort and id columns are only used to build the cursor.
+    """
+    key = decode_cursor(cursor, sort)
+    if key is not None:
+        last_value, last_id = key
+        if descending:
+            seek = or_(sort_column < last_value,
+                       and_(sort_column == last_value, id_column < last_id))
+        else:
+            seek = or_(sort_column > last_value,
+                       and_(sort_column == last_value, id_column > last_id))
+        query = query.filter(seek)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.add_columns(sort_column, id_column).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(sort, rows[-1][-2:])
+
+    items = [row[0] if len(row) == 3 else tuple(row[:-2]) for row in rows]
+    return KeysetPage(items, next_cursor, per_page)
@@ -1,11 +1,16 @@
-from flask import Blueprint, render_template, session
+from flask import Blueprint, render_template, session, request, jsonify, current_app
 from flask_login import login_required, current_user
-from models import Portfolio
+from models import db, Portfolio
 from stock_data import StockDataService
+from chart_data import ChartDataService
+from datetime import datetime
 import json
 
 analytics_bp = Blueprint('analytics', __name__)
 
+CHART_PERIODS = ('1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'max')
+CHART_EXCHANGES = ('US', 'NS', 'BO')
+
 @analytics_bp.route('/analytics')
 @login_required
 def view():
@@ -19,9 +24,11 @@ def view():
     country_allocation = {'US': 0, 'India': 0}
     stock_performance = []
 
+    cutoff = datetime.now() - current_app.config['PRICE_REFRESH_INTERVAL']
     for portfolio in portfolios:
-        # Update prices
-        StockDataService.update_portfolio_prices(portfolio.positions)
+        # Update stale prices
+        StockDataService.update_portfolio_prices(
+            [p for p in portfolio.positions if p.price_is_stale(cutoff)])
 
         for position in portfolio.positions:
             market_value = position.calculate_market_value(display_currency)
@@ -46,6 +53,9 @@ def view():
                 'value': market_value
             })
 
+    # Keep refreshed prices so the next view within the interval reuses them
+    db.session.commit()
+
     # Sort stocks by performance
     top_gainers = sorted(stock_performance, key=lambda x: x['return'], reverse=True)[:5]
     top_losers = sorted(stock_performance, key=lambda x: x['return'])[:5]
@@ -64,4 +74,19 @@ def view():
                          country_allocation=json.dumps(country_allocation),
                          top_gainers=top_gainers,
                          top_losers=top_losers,
-                         display_currency=display_currency)
\ No newline at end of file
+                         display_currency=display_currency)
+
+@analytics_bp.route('/chart/<ticker>')
+@login_required
+def chart(ticker):
+    """Downsampled closing price series for a ticker as compact JSON arrays"""
+    exchange = request.args.get('exchange', 'US')
+    if exchange not in CHART_EXCHANGES:
+        exchange = 'US'
+    period = request.args.get('period', '1y')
+    if period not in CHART_PERIODS:
+        period = '1y'
+    width = request.args.get('width', 800, type=int)
+
+    series = ChartDataService.get_price_series(ticker.upper(), exchange, period, width)
+    return jsonify(series)
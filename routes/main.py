@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from models import db, Portfolio
 from datetime import datetime, timedelta
 from currency_utils import CurrencyConverter
+from xirr import ReturnsService
 
 main_bp = Blueprint('main', __name__)
 
@@ -24,6 +25,7 @@ def dashboard():
     total_gain_loss = total_value - total_invested
     total_return = ((total_value - total_invested) / total_invested * 100) if total_invested > 0 else 0
     total_holdings = sum(len(p.positions) for p in portfolios)
+    returns = ReturnsService.get_user_returns(current_user.id)
 
     # Prepare data for charts
     allocation_labels = []
@@ -45,6 +47,8 @@ def dashboard():
                          total_gain_loss=total_gain_loss,
                          total_return=total_return,
                          total_holdings=total_holdings,
+                         total_xirr=returns['total'],
+                         portfolio_xirr=returns['portfolios'],
                          allocation_labels=allocation_labels,
                          allocation_values=allocation_values,
                          performance_dates=performance_dates,
@@ -1,18 +1,116 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy import case, func
 from models import db, Portfolio, Position
 from forms import PortfolioForm, PositionForm
 from stock_data import StockDataService
+from currency_utils import CurrencyConverter
+from pagination import keyset_paginate
+from symbol_index import symbol_index
+from xirr import ReturnsService
 from datetime import datetime
 
 portfolio_bp = Blueprint('portfolio', __name__)
 
+# Sortable columns for the paginated listings, keyed by the ?sort= value
+PORTFOLIO_SORTS = ('name', 'value', 'return')
+POSITION_SORTS = {
+    'value': Position.value_inr,
+    'return': Position.return_pct,
+    'ticker': Position.ticker,
+    'sector': Position.sector_label,
+}
+ALLOCATION_SLICES = 10
+SYMBOL_SEARCH_LIMIT = 10
+
+def _warn_unknown_symbol(ticker, exchange):
+    """Flash a warning when a full symbol master is configured but lacks the ticker"""
+    if not current_app.config['WARN_UNKNOWN_SYMBOLS']:
+        return
+    if len(symbol_index) and not symbol_index.contains(ticker, exchange):
+        flash(f'{ticker.upper()} was not found in the symbol list for {exchange}. '
+              'Check the ticker if no price is shown.', 'warning')
+
+def _portfolio_totals():
+    """Per-portfolio INR value, cost and holdings count, aggregated in SQL"""
+    return db.session.query(
+        Position.portfolio_id.label('portfolio_id'),
+        func.sum(Position.value_inr).label('value'),
+        func.sum(Position.cost_inr).label('cost'),
+        func.count(Position.id).label('holdings')
+    ).group_by(Position.portfolio_id)
+
+def _sort_args(allowed, default_sort, default_order):
+    """Read and validate the sort and order query parameters"""
+    sort = request.args.get('sort', default_sort)
+    if sort not in allowed:
+        sort = default_sort
+    order = request.args.get('order', default_order)
+    if order not in ('asc', 'desc'):
+        order = default_order
+    return sort, order
+
 @portfolio_bp.route('/portfolios')
 @login_required
 def list_portfolios():
     display_currency = session.get('display_currency', 'INR')
-    portfolios = Portfolio.query.filter_by(user_id=current_user.id).all()
-    return render_template('portfolios.html', portfolios=portfolios, display_currency=display_currency)
+    sort, order = _sort_args(PORTFOLIO_SORTS, 'name', 'asc')
+
+    per_page = current_app.config['ITEMS_PER_PAGE']
+    cursor = request.args.get('after')
+
+    if sort == 'name':
+        # Page through the user's portfolios on the (user_id, name, id) index,
+        # then aggregate positions for this page's portfolios only
+        query = Portfolio.query.filter(Portfolio.user_id == current_user.id)
+        page = keyset_paginate(query, sort, Portfolio.name, Portfolio.id,
+                               descending=order == 'desc', cursor=cursor, per_page=per_page)
+        totals = {row.portfolio_id: row for row in
+                  _portfolio_totals().filter(Position.portfolio_id.in_([p.id for p in page])).all()}
+        rows = []
+        for portfolio in page:
+            row = totals.get(portfolio.id)
+            value, cost, holdings = (row.value, row.cost, row.holdings) if row else (0.0, 0.0, 0)
+            rows.append((portfolio, value, ((value - cost) / cost * 100) if cost > 0 else 0, holdings))
+    else:
+        # Sorting by a total needs every portfolio's total, but only this user's
+        user_portfolios = db.session.query(Portfolio.id).filter(Portfolio.user_id == current_user.id)
+        totals = _portfolio_totals() \
+            .filter(Position.portfolio_id.in_(user_portfolios.scalar_subquery())).subquery()
+
+        value = func.coalesce(totals.c.value, 0.0)
+        cost = func.coalesce(totals.c.cost, 0.0)
+        total_return = case((cost > 0, (value - cost) * 100.0 / cost), else_=0.0)
+        sort_columns = {'value': value, 'return': total_return}
+
+        query = db.session.query(
+            Portfolio, value, total_return, func.coalesce(totals.c.holdings, 0)
+        ).outerjoin(totals, totals.c.portfolio_id == Portfolio.id) \
+            .filter(Portfolio.user_id == current_user.id)
+
+        page = keyset_paginate(query, sort, sort_columns[sort], Portfolio.id,
+                               descending=order == 'desc', cursor=cursor, per_page=per_page)
+        rows = page.items
+
+    returns = ReturnsService.get_user_returns(current_user.id)
+    portfolios = [{
+        'portfolio': portfolio,
+        'value': CurrencyConverter.convert(value_inr, 'INR', display_currency),
+        'return': portfolio_return,
+        'xirr': returns['portfolios'].get(portfolio.id),
+        'holdings': holdings
+    } for portfolio, value_inr, portfolio_return, holdings in rows]
+
+    return render_template('portfolios.html', portfolios=portfolios, page=page,
+                           sort=sort, order=order, display_currency=display_currency)
+
+@portfolio_bp.route('/symbols')
+@login_required
+def search_symbols():
+    """Ticker autocomplete over the local symbol master"""
+    query = request.args.get('q', '')
+    exchange = request.args.get('exchange', '').strip().upper() or None
+    return jsonify(symbol_index.search(query, exchange, limit=SYMBOL_SEARCH_LIMIT))
 
 @portfolio_bp.route('/portfolio/<int:id>')
 @login_required
@@ -23,11 +121,79 @@ def view(id):
         flash('Access denied.', 'error')
         return redirect(url_for('main.dashboard'))
 
-    # Update position prices
-    positions = StockDataService.update_portfolio_prices(portfolio.positions)
-    db.session.commit()
+    # Refresh stale prices for the whole portfolio before sorting, so the
+    # order, filters, cursor and totals all use the same prices
+    cutoff = datetime.now() - current_app.config['PRICE_REFRESH_INTERVAL']
+    stale = Position.query.filter(Position.portfolio_id == portfolio.id,
+                                  Position.price_is_stale(cutoff)).all()
+    if stale:
+        StockDataService.update_portfolio_prices(stale)
+        db.session.commit()
+
+    sort, order = _sort_args(POSITION_SORTS, 'value', 'desc')
+    filters = {
+        'exchange': request.args.get('exchange', ''),
+        'sector': request.args.get('sector', ''),
+        'movement': request.args.get('movement', '')
+    }
+
+    query = Position.query.filter(Position.portfolio_id == portfolio.id)
+    if filters['exchange']:
+        query = query.filter(Position.exchange == filters['exchange'])
+    if filters['sector']:
+        query = query.filter(Position.sector_label == filters['sector'])
+    if filters['movement'] == 'gainers':
+        query = query.filter(Position.return_pct > 0)
+    elif filters['movement'] == 'losers':
+        query = query.filter(Position.return_pct < 0)
+
+    page = keyset_paginate(query, sort, POSITION_SORTS[sort], Position.id,
+                           descending=order == 'desc',
+                           cursor=request.args.get('after'),
+                           per_page=current_app.config['ITEMS_PER_PAGE'])
+
+    # Summary and chart data aggregated in SQL across the whole portfolio
+    in_portfolio = Position.portfolio_id == portfolio.id
+    total_value, total_cost, total_holdings = db.session.query(
+        func.coalesce(func.sum(Position.value_inr), 0.0),
+        func.coalesce(func.sum(Position.cost_inr), 0.0),
+        func.count(Position.id)
+    ).filter(in_portfolio).one()
+
+    sector_rows = db.session.query(Position.sector_label, func.sum(Position.value_inr)) \
+        .filter(in_portfolio).group_by(Position.sector_label).all()
+    sector_allocation = {sector: CurrencyConverter.convert(value, 'INR', display_currency)
+                         for sector, value in sector_rows}
+
+    allocation_rows = db.session.query(Position.ticker, Position.value_inr) \
+        .filter(in_portfolio).order_by(Position.value_inr.desc(), Position.id.desc()) \
+        .limit(ALLOCATION_SLICES).all()
+    allocation = {}
+    for ticker, value in allocation_rows:
+        allocation[ticker] = allocation.get(ticker, 0) + value
+    other_value = total_value - sum(allocation.values())
+    if total_holdings > ALLOCATION_SLICES and other_value > 0:
+        allocation['Other'] = other_value
+    allocation = {ticker: CurrencyConverter.convert(value, 'INR', display_currency)
+                  for ticker, value in allocation.items()}
+
+    sectors = [row[0] for row in db.session.query(Position.sector_label)
+               .filter(in_portfolio).distinct().order_by(Position.sector_label)]
+
+    returns = ReturnsService.get_user_returns(current_user.id)
+    summary = {
+        'value': CurrencyConverter.convert(total_value, 'INR', display_currency),
+        'cost': CurrencyConverter.convert(total_cost, 'INR', display_currency),
+        'return': ((total_value - total_cost) / total_cost * 100) if total_cost > 0 else 0,
+        'xirr': returns['portfolios'].get(portfolio.id),
+        'holdings': total_holdings
+    }
 
-    return render_template('portfolio_view.html', portfolio=portfolio, display_currency=display_currency)
+    return render_template('portfolio_view.html', portfolio=portfolio, page=page,
+                           summary=summary, position_xirr=returns['positions'],
+                           sector_allocation=sector_allocation,
+                           allocation=allocation, sectors=sectors, sort=sort,
+                           order=order, filters=filters, display_currency=display_currency)
 
 @portfolio_bp.route('/portfolio/create', methods=['GET', 'POST'])
 @login_required
@@ -113,6 +279,7 @@ def add_position(portfolio_id):
         db.session.add(position)
         db.session.commit()
         flash('Position added successfully!', 'success')
+        _warn_unknown_symbol(form.ticker.data, form.exchange.data)
         return redirect(url_for('portfolio.view', id=portfolio.id))
 
     return render_template('position_form.html', form=form, portfolio=portfolio)
@@ -149,6 +316,7 @@ def edit_position(id):
 
         db.session.commit()
         flash('Position updated successfully!', 'success')
+        _warn_unknown_symbol(form.ticker.data, form.exchange.data)
         return redirect(url_for('portfolio.view', id=portfolio.id))
 
     return render_template('position_form.html', form=form, portfolio=portfolio, editing=True)
@@ -0,0 +1,181 @@
+import bisect
+import csv
+import os
+import threading
+import time
+
+class SymbolIndex:
+    """In-memory prefix index over a local symbol master file.
+
+    The master is a CSV file with ticker, name and exchange columns, where
+    exchange is US, NS or BO as in PositionForm. Lookups bisect two sorted
+    arrays of (key, ticker, exchange) tuples, one keyed by ticker and one by
+    company name and each word of it, so a prefix query only touches the
+    matching range. When the file changes it is reloaded in a background
+    thread, and only the added and removed rows are applied to the arrays.
+    """
+
+    # Seconds between checks of the master file's modification time
+    RELOAD_INTERVAL = 5
+    # Rebuild from scratch instead of patching when this share of rows changed
+    REBUILD_RATIO = 0.2
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._reloading = threading.Event()
+        self._symbols = {}
+        self._ticker_keys = []
+        self._name_keys = []
+        self._mtime = None
+        self._checked_at = 0
+
+    def init_app(self, app):
+        self.path = app.config.get('SYMBOL_MASTER_PATH')
+        self.reload()
+        app.extensions['symbol_index'] = self
+
+    def __len__(self):
+        return len(self._symbols)
+
+    @staticmethod
+    def _read_master(path):
+        """Read the master file into a {(ticker, exchange): name} mapping"""
+        symbols = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                ticker = (row.get('ticker') or '').strip().upper()
+                exchange = (row.get('exchange') or 'US').strip().upper()
+                if ticker:
+                    symbols[(ticker, exchange)] = (row.get('name') or ticker).strip()
+        return symbols
+
+    @staticmethod
+    def _name_entries(ticker, exchange, name):
+        words = name.lower().split()
+        keys = {name.lower()} | set(words[1:])
+        return [(key, ticker, exchange) for key in keys]
+
+    def _sorted_keys(self, symbols):
+        ticker_keys = sorted((ticker.lower(), ticker, exchange)
+                             for ticker, exchange in symbols)
+        name_keys = sorted(entry for (ticker, exchange), name in symbols.items()
+                           for entry in self._name_entries(ticker, exchange, name))
+        return ticker_keys, name_keys
+
+    @staticmethod
+    def _insert(keys, entry):
+        bisect.insort(keys, entry)
+
+    @staticmethod
+    def _remove(keys, entry):
+        i = bisect.bisect_left(keys, entry)
+        if i < len(keys) and keys[i] == entry:
+            del keys[i]
+
+    def _apply_changes(self, old, symbols, removed, added):
+        for ticker, exchange in removed:
+            self._remove(self._ticker_keys, (ticker.lower(), ticker, exchange))
+            for entry in self._name_entries(ticker, exchange, old[(ticker, exchange)]):
+                self._remove(self._name_keys, entry)
+        for ticker, exchange in added:
+            self._insert(self._ticker_keys, (ticker.lower(), ticker, exchange))
+            for entry in self._name_entries(ticker, exchange, symbols[(ticker, exchange)]):
+                self._insert(self._name_keys, entry)
+        self._symbols = symbols
+
+    def reload(self):
+        """Load the master file, applying only the changes since the last load.
+
+        Parsing, diffing and any full rebuild happen without holding the
+        lookup lock; searches only wait while the result is swapped in or a
+        small diff is patched into the arrays.
+        """
+        with self._reload_lock:
+            if not self.path or not os.path.exists(self.path):
+                return False
+            mtime = os.path.getmtime(self.path)
+            try:
+                symbols = self._read_master(self.path)
+            except (OSError, csv.Error, UnicodeDecodeError) as e:
+                print(f"Error loading symbol master {self.path}: {e}")
+                return False
+
+            # Only reload() writes the index, so reading it here is safe
+            old = self._symbols
+            removed = [key for key in old if symbols.get(key) != old[key]]
+            added = [key for key in symbols if old.get(key) != symbols[key]]
+
+            if self._mtime is None or \
+                    len(removed) + len(added) > self.REBUILD_RATIO * max(len(old), 1):
+                ticker_keys, name_keys = self._sorted_keys(symbols)
+                with self._lock:
+                    self._symbols = symbols
+                    self._ticker_keys = ticker_keys
+                    self._name_keys = name_keys
+            else:
+                with self._lock:
+                    self._apply_changes(old, symbols, removed, added)
+            self._mtime = mtime
+            return True
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        finally:
+            self._reloading.clear()
+
+    def _reload_if_changed(self):
+        """Start a background reload if the master file changed, without waiting for it"""
+        now = time.monotonic()
+        if now - self._checked_at < self.RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            changed = self.path and os.path.getmtime(self.path) != self._mtime
+        except OSError:
+            return
+        if changed and not self._reloading.is_set():
+            self._reloading.set()
+            threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    @staticmethod
+    def _scan(keys, prefix, exchange, seen, results, limit):
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and len(results) < limit:
+            key, ticker, symbol_exchange = keys[i]
+            if not key.startswith(prefix):
+                break
+            i += 1
+            if exchange and symbol_exchange != exchange:
+                continue
+            if (ticker, symbol_exchange) not in seen:
+                seen.add((ticker, symbol_exchange))
+                results.append((ticker, symbol_exchange))
+
+    def search(self, query, exchange=None, limit=10):
+        """Symbols whose ticker, company name or a name word starts with query.
+
+        Ticker matches come first, then name matches, each in alphabetical order.
+        """
+        self._reload_if_changed()
+        prefix = query.strip().lower()
+        if not prefix:
+            return []
+
+        seen = set()
+        results = []
+        with self._lock:
+            self._scan(self._ticker_keys, prefix, exchange, seen, results, limit)
+            self._scan(self._name_keys, prefix, exchange, seen, results, limit)
+            return [{'ticker': ticker, 'exchange': symbol_exchange,
+                     'name': self._symbols[(ticker, symbol_exchange)]}
+                    for ticker, symbol_exchange in results]
+
+    def contains(self, ticker, exchange):
+        """Whether the master lists the ticker on the exchange"""
+        self._reload_if_changed()
+        return (ticker.strip().upper(), exchange) in self._symbols
+
+symbol_index = SymbolIndex()
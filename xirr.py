@@ -0,0 +1,193 @@
+import threading
+from collections import defaultdict
+from datetime import date
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, Portfolio, Position
+
+DAYS_PER_YEAR = 365.0
+# Lower bound of the search bracket, just above a -100% return
+MIN_RATE = -0.9999
+# Upper bounds tried in turn until the NPV changes sign
+MAX_RATES = (1.0, 10.0, 1e2, 1e3, 1e4, 1e6)
+
+def _npv(rates, amounts, years, series):
+    """NPV and its derivative for every series at its own rate"""
+    growth = 1.0 + rates[series]
+    discounted = amounts * growth ** -years
+    npv = np.bincount(series, discounted, minlength=len(rates))
+    slope = np.bincount(series, -years * discounted / growth, minlength=len(rates))
+    return npv, slope
+
+def xirr(amounts, years, series, count, tol=1e-9, max_iter=100):
+    """Solve the annualized internal rate of return of many cash-flow series at once.
+
+    The flows of all series are passed as flat arrays: amounts (negative for
+    money invested), years since the series' first flow, and the index of the
+    series each flow belongs to. Each series is solved with Newton's method,
+    falling back to bisection whenever a step leaves the bracket around the
+    root, so every iteration is a single vectorized pass over all flows.
+    Series that lose money even at a -100% rate, such as a position now worth
+    0, have their root at or below -100% and come back as -1.0. Other series
+    without a root (no time span, or gains beyond the bracket) come back as NaN.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    series = np.asarray(series, dtype=np.int64)
+    if count == 0:
+        return np.empty(0)
+
+    lo = np.full(count, MIN_RATE)
+    f_lo, _ = _npv(lo, amounts, years, series)
+
+    # Find an upper bound where the NPV has the opposite sign
+    hi = np.full(count, np.nan)
+    for bound in MAX_RATES:
+        missing = np.isnan(hi)
+        if not missing.any():
+            break
+        f_bound, _ = _npv(np.full(count, bound), amounts, years, series)
+        hi[missing & (np.sign(f_bound) != np.sign(f_lo)) & (f_bound != 0)] = bound
+
+    solvable = ~np.isnan(hi) & (f_lo != 0)
+    hi = np.where(solvable, hi, 1.0)
+
+    # Money in with nothing back is a total loss even without a time span
+    inflows = np.bincount(series, np.maximum(amounts, 0.0), minlength=count)
+    span = np.zeros(count)
+    np.maximum.at(span, series, years)
+    total_loss = ~solvable & (f_lo < 0) & ((inflows == 0) | (span > 0))
+    rates = np.where(solvable, np.clip(0.1, lo, hi), np.where(total_loss, -1.0, np.nan))
+
+    active = solvable.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        npv, slope = _npv(np.where(active, rates, 0.0), amounts, years, series)
+
+        # Keep the root bracketed between lo and hi
+        same_side = np.sign(npv) == np.sign(f_lo)
+        lo = np.where(active & same_side, rates, lo)
+        f_lo = np.where(active & same_side, npv, f_lo)
+        hi = np.where(active & ~same_side, rates, hi)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = rates - npv / slope
+        outside = ~np.isfinite(step) | (step <= lo) | (step >= hi)
+        step = np.where(outside, (lo + hi) / 2, step)
+
+        done = (np.abs(step - rates) <= tol * (1 + np.abs(rates))) | (npv == 0)
+        rates = np.where(active, step, rates)
+        active &= ~done
+
+    return rates
+
+# Bumped whenever a portfolio's positions change in a way that affects XIRR,
+# so cached returns are recomputed. The versions live in this process only:
+# with several worker processes each keeps its own cache and only sees the
+# changes it flushed itself, and bulk or Core UPDATEs that bypass the ORM
+# session are not seen at all. Cached results still expire daily.
+_portfolio_versions = defaultdict(int)
+
+# Position columns that XIRR depends on. last_updated and notes are not
+# among them, so refreshing an unchanged price keeps the cache.
+XIRR_COLUMNS = ('current_price', 'quantity', 'buy_price', 'buy_date', 'exchange', 'portfolio_id')
+
+@event.listens_for(Session, 'after_flush')
+def _track_position_changes(session, flush_context):
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Position) and obj.portfolio_id is not None:
+            _portfolio_versions[obj.portfolio_id] += 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Position):
+            continue
+        attrs = inspect(obj).attrs
+        for column in XIRR_COLUMNS:
+            history = attrs[column].history
+            # Compare values ourselves: SQLAlchemy flags a numpy float set to an
+            # equal price (as yfinance returns) as a change
+            if not history.has_changes() or list(history.added) == list(history.deleted):
+                continue
+            if column == 'portfolio_id':
+                # A position moved between portfolios changes the old one too
+                for portfolio_id in history.deleted:
+                    if portfolio_id is not None:
+                        _portfolio_versions[portfolio_id] += 1
+            _portfolio_versions[obj.portfolio_id] += 1
+            break
+
+class ReturnsService:
+    """Annualized money-weighted returns (XIRR) for positions, portfolios and users"""
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _to_percent(rate):
+        return None if np.isnan(rate) else float(rate * 100)
+
+    @classmethod
+    def calculate(cls, positions, today=None):
+        """XIRR in percent for each position, each portfolio and all positions together.
+
+        Each position is a buy of its INR cost on buy_date and a sale at its
+        INR market value today. Portfolio and overall series combine the flows
+        of their positions. All series are solved in one batched call.
+        """
+        today = today or date.today()
+        positions = list(positions)
+        portfolio_ids = sorted({p.portfolio_id for p in positions})
+        portfolio_series = {pid: len(positions) + i for i, pid in enumerate(portfolio_ids)}
+        total_series = len(positions) + len(portfolio_ids)
+
+        buy_dates = np.array([p.buy_date.toordinal() for p in positions], dtype=np.float64)
+        costs = np.array([p.cost_inr for p in positions], dtype=np.float64)
+        values = np.array([p.value_inr for p in positions], dtype=np.float64)
+        position_index = np.arange(len(positions))
+        owner_index = np.array([portfolio_series[p.portfolio_id] for p in positions], dtype=np.int64)
+        total_index = np.full(len(positions), total_series, dtype=np.int64)
+
+        # Every position contributes its buy and sale to three series
+        series = np.concatenate([position_index, owner_index, total_index] * 2)
+        amounts = np.concatenate([-costs] * 3 + [values] * 3)
+        days = np.concatenate([buy_dates] * 3 + [np.full(len(positions) * 3, today.toordinal())])
+
+        count = total_series + 1
+        first_day = np.full(count, np.inf)
+        np.minimum.at(first_day, series, days)
+        years = (days - first_day[series]) / DAYS_PER_YEAR
+
+        rates = xirr(amounts, years, series, count) if positions else np.full(count, np.nan)
+
+        return {
+            'positions': {p.id: cls._to_percent(rates[i]) for i, p in enumerate(positions)},
+            'portfolios': {pid: cls._to_percent(rates[portfolio_series[pid]]) for pid in portfolio_ids},
+            'total': cls._to_percent(rates[total_series])
+        }
+
+    @classmethod
+    def get_user_returns(cls, user_id):
+        """XIRR for all of a user's positions and portfolios, cached until they change"""
+        portfolio_ids = [pid for (pid,) in db.session.query(Portfolio.id)
+                         .filter(Portfolio.user_id == user_id).order_by(Portfolio.id)]
+        key = (date.today(), tuple((pid, _portfolio_versions[pid]) for pid in portfolio_ids))
+
+        with cls._lock:
+            cached = cls._cache.get(user_id)
+            if cached and cached[0] == key:
+                return cached[1]
+
+        # Plain rows rather than ORM objects, with values converted in SQL
+        positions = db.session.query(
+            Position.id, Position.portfolio_id, Position.buy_date,
+            Position.cost_inr.label('cost_inr'), Position.value_inr.label('value_inr')
+        ).join(Portfolio).filter(Portfolio.user_id == user_id).all()
+        result = cls.calculate(positions)
+        for pid in portfolio_ids:
+            result['portfolios'].setdefault(pid, None)
+
+        with cls._lock:
+            cls._cache[user_id] = (key, result)
+        return result